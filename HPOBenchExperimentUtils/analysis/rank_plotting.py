@@ -1,4 +1,6 @@
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Union, List
 
@@ -107,16 +109,20 @@ def plot_ranks(benchmarks: List[str], familyname: str, output_dir: Union[Path, s
     benchmark_spec = plot_dc.get(benchmarks[0], {})
     benchmark_settings = get_benchmark_settings(benchmarks[0])
 
-    all_trajectories = []
     horizon = []
     x_lo = []
     for b in benchmarks:
         benchmark_settings = get_benchmark_settings(b)
         horizon.append(benchmark_settings['time_limit_in_s'])
         x_lo.append(benchmark_spec.get("xlim_lo", 1))
-        tr = read_trajectories(benchmark=b, input_dir=input_dir, train=unvalidated, which=which,
-                               opt_list=opt_list, output_dir=output_dir)
-        all_trajectories.append(tr)
+
+    # The benchmarks are independent: Read their trajectories in parallel processes.
+    n_jobs = min(len(benchmarks), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        futures = [executor.submit(read_trajectories, benchmark=b, input_dir=input_dir, train=unvalidated,
+                                   which=which, opt_list=opt_list, output_dir=output_dir)
+                   for b in benchmarks]
+        all_trajectories = [future.result() for future in futures]
     assert len(set(horizon)) == 1
     horizon = int(horizon[0])
     _log.info(f"Handling horizon: {horizon}sec")
@@ -149,12 +155,13 @@ def plot_ranks(benchmarks: List[str], familyname: str, output_dir: Union[Path, s
             r_tmp = all_trajectories_tmp.rank(axis=1, na_option="bottom")
             all_rankings.append(r_tmp)
 
+    # Stack the rankings of all iterations and tasks into a single frame. Per optimizer, unstacking it gives one row per
+    # ranking and one column per time step (sorted over all tasks).
+    all_rankings = pd.concat(all_rankings, keys=range(len(all_rankings)))
+
     final_ranks = []
     for i, model in enumerate(opt_list):
-        ranks_for_model = []
-        for ranking in all_rankings:
-            ranks_for_model.append(ranking.loc[:, model])
-        ranks_for_model = pd.DataFrame(ranks_for_model)
+        ranks_for_model = all_rankings[model].unstack()
         ranks_for_model = ranks_for_model.fillna(method='ffill', axis=1)
         if criterion == "mean":
             final_ranks.append(ranks_for_model.mean(skipna=True))
@@ -262,4 +269,5 @@ def plot_ecdf_per_family(benchmarks: List[str], familyname: str, output_dir: Uni
 
     unify_layout(a)
     plt.tight_layout()
-    plt.savefig(Path(output_dir) / f'ecdf_random_{familyname}.png')
\ No newline at end of file
+    plt.savefig(Path(output_dir) / f'ecdf_random_{familyname}.png')
+    plt.close('all')
@@ -4,13 +4,14 @@ from typing import Union, List
 
 import json
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 import numpy as np
 import pandas as pd
-from collections import defaultdict
 import scipy.stats as scst
+from collections import defaultdict
 
 from HPOBenchExperimentUtils import _log as _main_log
-from HPOBenchExperimentUtils.utils.validation_utils import load_json_files, \
+from HPOBenchExperimentUtils.utils.validation_utils import load_json_files_cached, preload_json_files, \
     load_trajectories_as_df, df_per_optimizer
 from HPOBenchExperimentUtils.utils.plotting_utils import plot_dc, color_per_opt, marker_per_opt,\
     unify_layout
@@ -19,6 +20,78 @@ from HPOBenchExperimentUtils.utils.runner_utils import get_optimizer_setting, ge
 _main_log.setLevel(logging.DEBUG)
 _log = logging.getLogger(__name__)
 
+try:
+    from numba import njit, prange
+    _log.debug("Use numba")
+except:
+    njit = None
+    prange = range
+    _log.debug("Using numpy/scipy. Installing numba could provide speedup")
+
+try:
+    import orjson
+
+    def _config_key(configuration):
+        return orjson.dumps(configuration, option=orjson.OPT_SORT_KEYS)
+    _log.debug("Use orjson")
+except:
+    def _config_key(configuration):
+        return json.dumps(configuration, sort_keys=True)
+    _log.debug("Using json. Installing orjson could provide speedup")
+
+
+def _rankdata(x):
+    """ Average ranks of a 1d array (same as `scipy.stats.rankdata`). """
+    n = x.shape[0]
+    order = np.argsort(x, kind='mergesort')
+    ranks = np.empty(n)
+    i = 0
+    while i < n:
+        j = i
+        while j + 1 < n and x[order[j + 1]] == x[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = 0.5 * (i + j) + 1
+        i = j + 1
+    return ranks
+
+
+def _pairwise_spearman(values):
+    """
+    Spearman correlation between all columns of `values` on the pairwise complete observations (NaN = missing).
+    Returns the correlation matrix and the number of observations per pair of columns.
+    """
+    n_cols = values.shape[1]
+    cor = np.full((n_cols, n_cols), np.nan)
+    n_obs = np.zeros((n_cols, n_cols), dtype=np.int64)
+    valid = ~np.isnan(values)
+    for i in prange(n_cols):
+        n_obs[i, i] = valid[:, i].sum()
+        for j in range(i + 1, n_cols):
+            both = valid[:, i] & valid[:, j]
+            n = both.sum()
+            n_obs[i, j] = n
+            n_obs[j, i] = n
+            if n < 2:
+                continue
+            rx = _rankdata(values[:, i][both])
+            ry = _rankdata(values[:, j][both])
+            dx = rx - rx.mean()
+            dy = ry - ry.mean()
+            denom = np.sqrt((dx * dx).sum() * (dy * dy).sum())
+            if denom > 0:
+                cor[i, j] = (dx * dy).sum() / denom
+                cor[j, i] = cor[i, j]
+    return cor, n_obs
+
+
+if njit is not None:
+    _rankdata = njit(cache=True)(_rankdata)
+    _pairwise_spearman = njit(parallel=True, cache=True)(_pairwise_spearman)
+else:
+    # Without numba, the python loops of `_rankdata` are slow. scipy computes the same average ranks.
+    _rankdata = scst.rankdata
+
 
 def plot_fidels(benchmark: str, output_dir: Union[Path, str], input_dir: Union[Path, str], opts: str,
                 opt_list: Union[List[str], None]=None, **kwargs):
@@ -34,6 +107,9 @@ def plot_fidels(benchmark: str, output_dir: Union[Path, str], input_dir: Union[P
     if opt_list is None:
         opt_list = list(opt_rh_dc.keys())
 
+    # Parse the runhistories of all optimizers in parallel. The loop below reads them from the cache.
+    preload_json_files([opt_rh_dc[opt] for opt in opt_list if len(opt_rh_dc.get(opt, [])) > 0])
+
     other_stats_dc = dict()
     best_val = 1000
     other_stats_dc["lowest"] = best_val
@@ -46,9 +122,9 @@ def plot_fidels(benchmark: str, output_dir: Union[Path, str], input_dir: Union[P
         if opt not in opt_list:
             _log.info(f'Skip {opt}')
             continue
-        if len(opt_rh_dc) == 0: continue
+        if len(opt_rh_dc[opt]) == 0: continue
         other_stats_dc[opt] = defaultdict(list)
-        rhs = load_json_files(opt_rh_dc[opt])
+        rhs = load_json_files_cached(opt_rh_dc[opt])
         for rh in rhs:
             final_time = rh[-1]["finish_time"] - rh[0]["boot_time"]
             bench_time = rh[-1]["total_time_used"]
@@ -64,7 +140,7 @@ def plot_fidels(benchmark: str, output_dir: Union[Path, str], input_dir: Union[P
             sub = df[["fidel_values", "total_time_used"]].sample(n=thresh, random_state=1)
         else:
             sub = df[["fidel_values", "total_time_used"]]
-        avg = sub.shape[0] / len(df['id'].unique())
+        avg = sub.shape[0] / df['id'].nunique()
         
         max_f = np.max(sub["fidel_values"])
         vals = np.min(df.query('fidel_values == @max_f')["function_values"])
@@ -107,33 +183,54 @@ def plot_overhead(benchmark: str, output_dir: Union[Path, str], input_dir: Union
     if opt_list is None:
         opt_list = list(opt_rh_dc.keys())
 
+    # Parse the runhistories of all optimizers in parallel. The loop below reads them from the cache.
+    preload_json_files([opt_rh_dc[opt] for opt in opt_list if len(opt_rh_dc.get(opt, [])) > 0])
+
     plt.figure(figsize=[5, 5])
     a = plt.subplot(111)
     for opt in opt_rh_dc:
         _log.info(f'Handling {opt}')
         if opt not in opt_list:
             _log.info(f'Skip {opt}')
-        if len(opt_rh_dc) == 0: continue
-        rhs = load_json_files(opt_rh_dc[opt])
+        if len(opt_rh_dc[opt]) == 0: continue
+        rhs = load_json_files_cached(opt_rh_dc[opt])
         df = df_per_optimizer(opt, rhs)
-        nseeds = df['id'].unique()
-        for seed in nseeds:
-            steps = df[df['id'] == seed]["total_time_used"]
-            label = get_optimizer_setting(opt).get("display_name", opt)
-
-            benchmark_cost = df[df['id'] == seed]["finish_time"] - df[df['id'] == seed]["start_time"]
-            benchmark_cost = np.cumsum(benchmark_cost)
-            plt.plot(steps, benchmark_cost, color='k', alpha=0.5, zorder=99,
-                     label=benchmark if seed == 0 and opt == list(opt_rh_dc.keys())[0] else None)
-
-            overhead = df[df['id'] == seed]["start_time"] - df[df['id'] == seed]["finish_time"].shift(1)
-            overhead = np.cumsum(overhead)
-            plt.plot(steps, overhead, color=color_per_opt.get(opt, "k"), linestyle=":", label=label if seed == 0 else None)
+        color = color_per_opt.get(opt, "k")
+        label = get_optimizer_setting(opt).get("display_name", opt)
 
-            overall_cost = df[df['id'] == seed]["finish_time"] - df[df['id'] == seed]["start_time"].iloc[0]
-            benchmark_cost = np.cumsum(overall_cost)
-            plt.plot(steps, overall_cost, color=color_per_opt.get(opt, "k"), alpha=0.5, zorder=99,
-                     label="%s overall" % label if seed == 0 else None)
+        # Collect the curves of all seeds and draw them as one collection per curve type.
+        benchmark_cost, overhead, overall_cost = [], [], []
+        for seed, seed_df in df.groupby('id', observed=True, sort=False):
+            steps = seed_df["total_time_used"].to_numpy()
+            start = seed_df["start_time"].to_numpy()
+            finish = seed_df["finish_time"].to_numpy()
+
+            # Write the curves directly into the (n, 2) segment arrays, cumulating in place.
+            segment = np.empty((steps.shape[0], 2))
+            segment[:, 0] = steps
+            np.subtract(finish, start, out=segment[:, 1])
+            np.cumsum(segment[:, 1], out=segment[:, 1])
+            benchmark_cost.append(segment)
+
+            # The overhead of the first run is unknown (no previous run).
+            segment = np.empty((steps.shape[0] - 1, 2))
+            segment[:, 0] = steps[1:]
+            np.subtract(start[1:], finish[:-1], out=segment[:, 1])
+            np.cumsum(segment[:, 1], out=segment[:, 1])
+            overhead.append(segment)
+
+            segment = np.empty((steps.shape[0], 2))
+            segment[:, 0] = steps
+            np.subtract(finish, start[0], out=segment[:, 1])
+            overall_cost.append(segment)
+
+        a.add_collection(LineCollection(benchmark_cost, colors='k', alpha=0.5, zorder=99,
+                                        label=benchmark if opt == list(opt_rh_dc.keys())[0] else None))
+        a.add_collection(LineCollection(overhead, colors=color, linestyles=":", label=label))
+        a.add_collection(LineCollection(overall_cost, colors=color, alpha=0.5, zorder=99,
+                                        label="%s overall" % label))
+
+    a.autoscale_view()
 
     a.set_yscale("log")
     a.set_xscale("log")
@@ -163,8 +260,9 @@ def plot_ecdf(benchmark: str, output_dir: Union[Path, str], input_dir: Union[Pat
     y_best = benchmark_spec.get("ystar_valid", 0)
 
     def ecdf(x):
+        n = x.size
         xs = np.sort(x)
-        ys = np.arange(1, len(xs) + 1) / float(len(xs))
+        ys = np.linspace(1.0, n, n) / n
         return xs, ys
 
     plt.figure(figsize=[5, 5])
@@ -173,11 +271,14 @@ def plot_ecdf(benchmark: str, output_dir: Union[Path, str], input_dir: Union[Pat
     if opt_list is None:
         opt_list = list(opt_rh_dc.keys())
 
+    # Parse the runhistories of all optimizers in parallel. The loop below reads them from the cache.
+    preload_json_files([opt_rh_dc[opt] for opt in opt_list if len(opt_rh_dc.get(opt, [])) > 0])
+
     for opt in opt_rh_dc:
         if opt not in opt_list:
             _log.info(f'Skip {opt}')
-        if len(opt_rh_dc) == 0: continue
-        rhs = load_json_files(opt_rh_dc[opt])
+        if len(opt_rh_dc[opt]) == 0: continue
+        rhs = load_json_files_cached(opt_rh_dc[opt])
         df = df_per_optimizer(opt, rhs, y_best=y_best)
         color = color_per_opt.get(opt, "k")
         obj_vals = df["function_values"]
@@ -185,11 +286,18 @@ def plot_ecdf(benchmark: str, output_dir: Union[Path, str], input_dir: Union[Pat
         label = get_optimizer_setting(opt).get("display_name", opt)
         plt.plot(x, y, c=color, linewidth=2, label=label)
 
-        nseeds = df['id'].unique()
-        for seed in nseeds:
-            obj_vals = df[df['id'] == seed]["function_values"]
-            x, y = ecdf(obj_vals.to_numpy())
-            plt.plot(x, y, c=color, alpha=0.2)
+        # Sort once by seed and objective value, then split into the (already sorted) values per seed.
+        # Draw the ECDFs of all seeds as a single collection.
+        ids = df['id'].to_numpy()
+        vals = obj_vals.to_numpy()
+        order = np.lexsort((vals, ids))
+        splits = np.flatnonzero(np.diff(ids[order])) + 1
+        segments = []
+        for seed_vals in np.split(vals[order], splits):
+            n = seed_vals.size
+            segments.append(np.column_stack((seed_vals, np.linspace(1.0, n, n) / n)))
+        a.add_collection(LineCollection(segments, colors=color, alpha=0.2))
+    a.autoscale_view()
 
     if y_best != 0:
         plt.xlabel("Optimization Regret")
@@ -203,6 +311,7 @@ def plot_ecdf(benchmark: str, output_dir: Union[Path, str], input_dir: Union[Pat
     plt.tight_layout()
     plt.grid(b=True, which="both", axis="both", alpha=0.5)
     plt.savefig(Path(output_dir) / f'ecdf_{benchmark}_{opts}.png')
+    plt.close('all')
 
 
 def plot_correlation(benchmark: str, output_dir: Union[Path, str], input_dir: Union[Path, str], opts: str,
@@ -216,8 +325,10 @@ def plot_correlation(benchmark: str, output_dir: Union[Path, str], input_dir: Un
                                         which="runhistory")
     benchmark_spec = plot_dc.get(benchmark, {})
 
-    conf_dc = defaultdict(dict)
-    f_set = []
+    # Column-wise storage of all evaluations: configuration, fidelity, function value
+    conf_keys = []
+    fidel_values = []
+    func_values = []
 
     if opt_list is None:
         opt_list = list(opt_rh_dc.keys())
@@ -235,37 +346,51 @@ def plot_correlation(benchmark: str, output_dir: Union[Path, str], input_dir: Un
         _log.info("Read %s" % opt)
         if len(opt_rh_dc[opt]) == 0: continue
 
-        rhs = load_json_files(opt_rh_dc[opt])
+        rhs = load_json_files_cached(opt_rh_dc[opt])
         for rh in rhs:
             for record in rh[1:]:
-                c = json.dumps(record["configuration"], sort_keys=True)
-                f = record['fidelity'][list(record['fidelity'])[0]]
-                f_set.append(f)
-                conf_dc[c][f] = record["function_value"]
-
-    f_set = np.array(list(set(f_set)))
-    f_set.sort()
-    # Clean dc:
-    to_rm = []
-    for c in conf_dc:
-        if len(conf_dc[c]) < 2:
-            to_rm.append(c)
-    for c in to_rm:
-        del conf_dc[c]
+                conf_keys.append(_config_key(record["configuration"]))
+                fidel_values.append(next(iter(record['fidelity'].values())))
+                func_values.append(record["function_value"])
+
+    f_set = np.unique(fidel_values)
+    if f_set.size < 2:
+        _log.info(f'Skip plotting correlations: Found {f_set.size} fidelities for benchmark {benchmark}')
+        return
+
+    # Dense (n_configs x n_fidelities) matrix. Missing evaluations are NaN. If a configuration was evaluated multiple
+    # times on the same fidelity, use the last evaluation.
+    # Only keep configurations which were evaluated on at least 2 fidelities.
+    conf_df = pd.DataFrame({'c': conf_keys, 'f': fidel_values, 'v': func_values})
+    conf_df = conf_df.drop_duplicates(subset=['c', 'f'], keep='last').pivot(index='c', columns='f', values='v')
+    conf_df = conf_df[conf_df.notna().sum(axis=1) >= 2]
 
     # Start with computing correlations
-    cors = {}
-    for fi, f1 in enumerate(f_set):
-        cors[(f1, f1)] = (1, 0)
-        for f2 in f_set[fi+1:]:
-            a = []
-            b = []
-            for c in conf_dc:
-                if f1 in conf_dc[c] and f2 in conf_dc[c]:
-                    a.append(conf_dc[c][f1])
-                    b.append(conf_dc[c][f2])
-            c, _ = scst.spearmanr(a, b)
-            cors[(f1, f2)] = (c, len(a))
+    # The spearman correlation is computed on the pairwise complete observations. The number of observations per pair
+    # of fidelities is the product of the validity masks.
+    values = conf_df.to_numpy(dtype=np.float64)
+    if not np.isnan(values).any():
+        # No missing evaluations: The spearman correlation is the pearson correlation of the ranks. Compute it for all
+        # pairs at once with a single matrix product.
+        ranks = conf_df.rank().to_numpy(dtype=np.float64)
+        ranks -= ranks.mean(axis=0)
+        norm = np.sqrt((ranks * ranks).sum(axis=0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cor = (ranks.T @ ranks) / np.outer(norm, norm)
+        cor_df = pd.DataFrame(cor, index=conf_df.columns, columns=conf_df.columns)
+        n_df = pd.DataFrame(values.shape[0], index=conf_df.columns, columns=conf_df.columns)
+    else:
+        # Don't use DataFrame.corr here: It drops +-inf values (e.g. crashed configurations), while spearmanr ranks
+        # them as the largest/smallest values.
+        cor, n_obs = _pairwise_spearman(values)
+        cor_df = pd.DataFrame(cor, index=conf_df.columns, columns=conf_df.columns)
+        n_df = pd.DataFrame(n_obs, index=conf_df.columns, columns=conf_df.columns)
+
+    # Order both matrices by fidelity. The diagonal is reported as (1, 0).
+    cor = cor_df.reindex(index=f_set, columns=f_set).to_numpy(dtype=np.float64)
+    n_obs = n_df.reindex(index=f_set, columns=f_set).to_numpy(dtype=np.int64)
+    np.fill_diagonal(cor, 1)
+    np.fill_diagonal(n_obs, 0)
 
     # Create plot
     styles = [
@@ -283,7 +408,7 @@ def plot_correlation(benchmark: str, output_dir: Union[Path, str], input_dir: Un
     for fi, f in enumerate(f_set):
         if len(f_set[fi:]) == 0: continue
         c, m, lw, ms, ls = styles[fi]
-        a.plot(f_set[fi:], [cors[(f, f1)][0] for f1 in f_set[fi:]], label=f,
+        a.plot(f_set[fi:], cor[fi, fi:], label=f,
                marker=m, linewidth=lw, linestyle=ls, markersize=ms, c=c)
         #a.annotate("%d" % f, [f, 1.01], fontsize=15)
 
@@ -294,16 +419,12 @@ def plot_correlation(benchmark: str, output_dir: Union[Path, str], input_dir: Un
     unify_layout(a, legend_args={"title": "Fidelity value"})
     plt.tight_layout()
     plt.savefig(Path(output_dir) / f'correlation_{benchmark}.png')
+    plt.close('all')
 
-    # Create table
-    df = defaultdict(list)
-    for fi, f1 in enumerate(f_set[:-1]):
-        for fj, f2 in enumerate(f_set):
-            if fj < fi:
-                df[f1].append("-")
-            else:
-                df[f1].append("%.3g (%d)" % (np.round(cors[f1, f2][0], 3), cors[f1, f2][1]))
-    df = pd.DataFrame(df, index=f_set)
+    # Create table: One column per fidelity (except the highest one), only the upper triangle is filled.
+    cells = np.char.add(np.char.mod("%.3g (", np.round(cor, 3)), np.char.mod("%d)", n_obs))
+    cells[np.tril_indices(len(f_set), -1)] = "-"
+    df = pd.DataFrame(cells[:-1].T, index=f_set, columns=f_set[:-1])
     with open(Path(output_dir) / f'correlation_table_{benchmark}_{opts}.tex', 'w') as fh:
         latex = df.to_latex(index_names=False, index=True)
         print(latex)
@@ -325,6 +446,9 @@ def get_stats(benchmark: str, output_dir: Union[Path, str], input_dir: Union[Pat
     if opt_list is None:
         opt_list = list(opt_rh_dc.keys())
 
+    # Parse the runhistories of all optimizers in parallel. The loop below reads them from the cache.
+    preload_json_files([opt_rh_dc[opt] for opt in opt_list if len(opt_rh_dc.get(opt, [])) > 0])
+
     for opt in opt_rh_dc:
         _log.info(f'Read {opt}')
         if opt not in opt_list:
@@ -340,11 +464,8 @@ def get_stats(benchmark: str, output_dir: Union[Path, str], input_dir: Union[Pat
             "act_wc_time": [],
             "run_id": []
         }
-        for fl in opt_rh_dc[opt]:
-            with open(fl, "r") as fh:
-                lines = fh.readlines()
-            rh = [json.loads(line) for line in lines]
-
+        rhs = load_json_files_cached(opt_rh_dc[opt])
+        for fl, rh in zip(opt_rh_dc[opt], rhs):
             run_id = int(fl.parent.name.lstrip('run-'))
 
             # Some runhistories may have a boot-time entry while other dont.
@@ -1,4 +1,5 @@
 import logging
+import re
 from pathlib import Path
 from typing import Union, List
 
@@ -6,7 +7,7 @@ import numpy as np
 import pandas as pd
 import scipy.stats as scst
 
-from HPOBenchExperimentUtils.utils.validation_utils import load_json_files, \
+from HPOBenchExperimentUtils.utils.validation_utils import load_json_files_cached, \
     load_trajectories_as_df, df_per_optimizer
 from HPOBenchExperimentUtils import  _log as _main_log
 from HPOBenchExperimentUtils.utils.plotting_utils import plot_dc
@@ -16,46 +17,52 @@ _main_log.setLevel(logging.DEBUG)
 _log = logging.getLogger(__name__)
 
 
+_latex_replace_dc = {
+    '\\{': "{",
+    "\\}": "}",
+    "textbf": "\\textbf",
+    "underline": "\\underline",
+    'xgboostsub': r"\xgboostfrac",
+    'xgboostest': r"\xgboostnest",
+    'cartpolereduced': r"\cartpole",
+    "cartpolefull": "%cartpolefull",
+    'BNNOnBostonHousing': r"\bnnboston",
+    'BNNOnProteinStructure': r"\bnnprotein",
+    'BNNOnYearPrediction': r"\bnnyear",
+    'learna': r"\learna",
+    'NASCifar10ABenchmark': r"\NASA",
+    'NASCifar10BBenchmark': r"\NASB",
+    'NASCifar10CBenchmark': r"\NASC",
+    'SliceLocalizationBenchmark': r"\slice",
+    'ProteinStructureBenchmark': r"\protein",
+    'NavalPropulsionBenchmark': r"\naval",
+    'ParkinsonsTelemonitoringBenchmark': r"\parkinson",
+    'Cifar10NasBench201Benchmark': r"%\nbcifart",
+    'Cifar10ValidNasBench201Benchmark': r"\nbcifartv",
+    'Cifar100NasBench201Benchmark': r"\nbcifarh",
+    'ImageNetNasBench201Benchmark': r"\nbimage",
+    "SurrogateSVMBenchmark": r"\nsvmsurro",
+    "ParamNetReducedAdultOnTimeBenchmark": r"\paramadult",
+    "ParamNetReducedHiggsOnTimeBenchmark": r"\paramhiggs",
+    "ParamNetReducedLetterOnTimeBenchmark": r"\paramletter",
+    "ParamNetReducedMnistOnTimeBenchmark": r"\parammnist",
+    "ParamNetReducedOptdigitsOnTimeBenchmark": r"\paramoptdigits",
+    "ParamNetReducedPokerOnTimeBenchmark": r"\parampoker",
+    "NASBench1shot1SearchSpace1Benchmark": r"\NASOSOA",
+    "NASBench1shot1SearchSpace2Benchmark": r"\NASOSOB",
+    "NASBench1shot1SearchSpace3Benchmark": r"\NASOSOC",
+}
+
+# Apply all replacements in a single pass over the latex string. Longer keys first, in case one key is a prefix of
+# another one.
+_latex_replace_pattern = re.compile('|'.join(re.escape(key) for key in sorted(_latex_replace_dc, key=len,
+                                                                                reverse=True)))
+
+
 def write_latex(result_df, output_file, col_list):
-    replace_dc = {
-        '\\{': "{",
-        "\\}": "}",
-        "textbf": "\\textbf",
-        "underline": "\\underline",
-        'xgboostsub': r"\xgboostfrac",
-        'xgboostest': r"\xgboostnest",
-        'cartpolereduced': r"\cartpole",
-        "cartpolefull": "%cartpolefull",
-        'BNNOnBostonHousing': r"\bnnboston",
-        'BNNOnProteinStructure': r"\bnnprotein",
-        'BNNOnYearPrediction': r"\bnnyear",
-        'learna': r"\learna",
-        'NASCifar10ABenchmark': r"\NASA",
-        'NASCifar10BBenchmark': r"\NASB",
-        'NASCifar10CBenchmark': r"\NASC",
-        'SliceLocalizationBenchmark': r"\slice",
-        'ProteinStructureBenchmark': r"\protein",
-        'NavalPropulsionBenchmark': r"\naval",
-        'ParkinsonsTelemonitoringBenchmark': r"\parkinson",
-        'Cifar10NasBench201Benchmark': r"%\nbcifart",
-        'Cifar10ValidNasBench201Benchmark': r"\nbcifartv",
-        'Cifar100NasBench201Benchmark': r"\nbcifarh",
-        'ImageNetNasBench201Benchmark': r"\nbimage",
-        "SurrogateSVMBenchmark": r"\nsvmsurro",
-        "ParamNetReducedAdultOnTimeBenchmark": r"\paramadult",
-        "ParamNetReducedHiggsOnTimeBenchmark": r"\paramhiggs",
-        "ParamNetReducedLetterOnTimeBenchmark": r"\paramletter",
-        "ParamNetReducedMnistOnTimeBenchmark": r"\parammnist",
-        "ParamNetReducedOptdigitsOnTimeBenchmark": r"\paramoptdigits",
-        "ParamNetReducedPokerOnTimeBenchmark": r"\parampoker",
-        "NASBench1shot1SearchSpace1Benchmark": r"\NASOSOA",
-        "NASBench1shot1SearchSpace2Benchmark": r"\NASOSOB",
-        "NASBench1shot1SearchSpace3Benchmark": r"\NASOSOC",
-    }
     with open(output_file, 'w') as fh:
         latex = result_df.to_latex(index_names=False, index=False, columns=["benchmark"] + col_list)
-        for i in replace_dc:
-            latex = latex.replace(i, replace_dc[i])
+        latex = _latex_replace_pattern.sub(lambda match: _latex_replace_dc[match.group(0)], latex)
         print(latex)
         fh.write(latex)
 
@@ -83,60 +90,63 @@ def save_median_table(benchmark: str, output_dir: Union[Path, str], input_dir: U
     keys = list(unique_optimizer.keys())
     if opt_list is None:
         opt_list = keys
-    result_df = pd.DataFrame()
+    result_dfs = []
     for key in opt_list:
         if key not in keys:
             _log.info(f'Skip {key}')
             continue
-        trajectories = load_json_files(unique_optimizer[key])
+        trajectories = load_json_files_cached(unique_optimizer[key])
         optimizer_df = df_per_optimizer(
             key=key,
             unvalidated_trajectories=trajectories,
             y_best=y_best_val if unvalidated else y_best_test
         )
 
-        unique_ids = np.unique(optimizer_df['id'])
-        for unique_id in unique_ids:
-            df = optimizer_df[optimizer_df['id'] == unique_id]
-            df2 = pd.DataFrame([[key, unique_id, 0, 0, np.inf, df["fidel_values"].max(), 0, 0, 1], ], columns=df.columns)
-            df = df.append(df2, ignore_index=True)
-            df = df.sort_values(by='total_time_used')
-            df = df.drop(df[df["total_time_used"] > cut_time_step].index)
-            last_inc = df.tail(1)
-            if len(last_inc) <= 1:
-                _log.critical(f"{key} has not enough runs at timestep {cut_time_step}")
-
-            result_df = result_df.append(last_inc)
-
-    def q1(x):
-        return x.quantile(0.25)
-
-    def q3(x):
-        return x.quantile(0.75)
-
-    def lst(x):
-        x = np.array(x)
-        #x[x < 1e-6] = 1e-6
-        return list(x)
-
-    def median(x):
-        x = np.array(x)
-        #x[x < 1e-6] = 1e-6
-        return np.median(x)
-
-    # q1 = lambda x: x.quantile(0.25)
-    # q3 = lambda x: x.quantile(0.75)
-    aggregate_funcs = [median, q1, q3, lst]
-    result_df = result_df.groupby('optimizer').agg({'function_values': aggregate_funcs,
-                                                    'total_time_used': ['median']})
-    result_df.columns = ["_".join(x) for x in result_df.columns.ravel()]
+        unique_ids = pd.unique(optimizer_df['id'])
+
+        # Add one sentinel entry per run. It is selected if a run has no entries before the cut time step.
+        sentinels = pd.DataFrame({
+            "optimizer": key,
+            "id": unique_ids,
+            "total_time_used": 0,
+            "total_objective_costs": 0,
+            "function_values": np.inf,
+            "fidel_values": optimizer_df.groupby('id', observed=True)["fidel_values"].max().loc[unique_ids].to_numpy(),
+            "costs": 0,
+            "start_time": 0,
+            "finish_time": 1,
+        }, columns=optimizer_df.columns).astype(optimizer_df.dtypes.to_dict())
+        optimizer_df = pd.concat([optimizer_df, sentinels], ignore_index=True)
+
+        # Select the last entry of each run before the cut time step. Keep the runs ordered by their id, since the
+        # runs of the optimizers are compared pairwise below.
+        df = optimizer_df[optimizer_df["total_time_used"] <= cut_time_step]
+        df = df.sort_values(by='total_time_used', kind='mergesort')
+        last_inc = df.groupby('id', observed=True, sort=False).tail(1).sort_values(by='id', kind='mergesort')
+        if np.isinf(last_inc["function_values"]).any():
+            _log.critical(f"{key} has not enough runs at timestep {cut_time_step}")
+
+        result_dfs.append(last_inc)
+    # The optimizers have different categories, concat falls back to strings.
+    result_df = pd.concat(result_dfs)
+    result_df['optimizer'] = result_df['optimizer'].astype('category')
+
+    # Aggregate the runs per optimizer with the built-in (cython) groupby reductions
+    grouped = result_df.groupby('optimizer', observed=True)
+    result_df = pd.DataFrame({
+        'function_values_median': grouped['function_values'].median(),
+        'function_values_q1': grouped['function_values'].quantile(0.25),
+        'function_values_q3': grouped['function_values'].quantile(0.75),
+        'function_values_lst': grouped['function_values'].agg(list),
+        'total_time_used_median': grouped['total_time_used'].median(),
+    })
 
     # Compute some statistics
     opt_keys = list(result_df.index)
     opt_keys.sort()
 
     # get best optimizer
-    best_opt = opt_keys[result_df["function_values_median"].argmin()]
+    best_opt = result_df["function_values_median"].idxmin()
     best_opt_ls = [best_opt, ]
     best_val = np.array(result_df["function_values_lst"][best_opt])
     _log.info(f"{best_opt} is the best optimizer; found {len(best_val)} runs")
@@ -159,20 +169,15 @@ def save_median_table(benchmark: str, output_dir: Union[Path, str], input_dir: U
             if p > 0.05:
                 not_worse.append(opt)
 
-    for opt in opt_keys:
-        val = result_df["function_values_median"][opt]
-
-        if val < 1e-3:
-            val = "%.2e" % val
-        else:
-            val = "%.3g" % np.round(val, 3)
-
-        if opt in best_opt_ls:
-            val = r"underline{textbf{%s}}" % val
-        elif opt in not_worse:
-            val = r"underline{%s}" % val
-
-        result_df.loc[opt, "value"] = val
+    # Format all medians at once instead of branching per optimizer
+    vals = result_df["function_values_median"].to_numpy()
+    value = pd.Series(np.where(vals < 1e-3, np.char.mod("%.2e", vals), np.char.mod("%.3g", np.round(vals, 3))),
+                      index=result_df.index, dtype=object)
+    is_best = value.index.isin(best_opt_ls)
+    is_not_worse = value.index.isin(not_worse) & ~is_best
+    value[is_best] = r"underline{textbf{" + value[is_best] + "}}"
+    value[is_not_worse] = r"underline{" + value[is_not_worse] + "}"
+    result_df["value"] = value
 
     # result_df = result_df.round({
     #    "function_values_median": 3,
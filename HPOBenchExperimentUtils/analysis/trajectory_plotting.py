@@ -4,7 +4,7 @@ from typing import Union, List
 
 from HPOBenchExperimentUtils.utils.plotting_utils import plot_dc, color_per_opt, unify_layout, export_legend
 from HPOBenchExperimentUtils import _log as _main_log
-from HPOBenchExperimentUtils.utils.validation_utils import load_json_files, load_trajectories_as_df,\
+from HPOBenchExperimentUtils.utils.validation_utils import load_json_files_cached, load_trajectories_as_df,\
     get_statistics_df, df_per_optimizer
 from HPOBenchExperimentUtils.utils.runner_utils import get_optimizer_setting, get_benchmark_settings
 
@@ -34,7 +34,7 @@ def read_trajectories(benchmark: str, input_dir: Path, train: bool=True, y_best:
             _log.info(f'Skip {key}')
             continue
         optimizer_names.append(key)
-        trajectories = load_json_files(unique_optimizer[key])
+        trajectories = load_json_files_cached(unique_optimizer[key])
         optimizer_df = df_per_optimizer(key, trajectories, y_best=y_best)
         statistics_df.append(get_statistics_df(optimizer_df, what=what))
     return optimizer_names, trajectories, statistics_df
@@ -2,6 +2,11 @@ import argparse
 import logging
 import sys
 
+# The plots are only written to file. Select the non-interactive backend before pyplot is imported.
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
 from HPOBenchExperimentUtils.utils.runner_utils import get_benchmark_names
 from HPOBenchExperimentUtils.analysis.trajectory_plotting import plot_trajectory
 from HPOBenchExperimentUtils.analysis.stats_generation import plot_fidels, plot_overhead, \
@@ -10,6 +15,7 @@ from HPOBenchExperimentUtils.analysis.table_generation import save_median_table
 from HPOBenchExperimentUtils.analysis.rank_plotting import plot_ranks, plot_ecdf_per_family
 from HPOBenchExperimentUtils import _log as _root_log
 from HPOBenchExperimentUtils.utils.plotting_utils import benchmark_families
+from HPOBenchExperimentUtils.utils.validation_utils import clear_json_files_cache
 
 _root_log.setLevel(logging.DEBUG)
 _log = logging.getLogger(__name__)
@@ -43,6 +49,10 @@ def main(args, opt_list, get_stats_flag: bool = True):
         plot_trajectory(criterion=args.agg, **vars(args), opt_list=list_of_opt_to_consider,
                         whatobj='total_objective_costs')
 
+    # The tables and the trajectory plots share the parsed trajectories. The following steps only read the
+    # runhistories, so free the memory of the trajectories.
+    clear_json_files_cache()
+
     if args.what in ("all", "ecdf"):
         plot_ecdf(**vars(args), opt_list=list_of_opt_to_consider)
 
@@ -107,6 +117,8 @@ if __name__ == "__main__":
     parser.add_argument('--opts', choices=opt_list.keys(), default="all")
     args, unknown = parser.parse_known_args()
 
+    plt.ioff()
+
     if args.opts == 'all':
         for opt in opt_list.keys():
             args.opts = opt
@@ -96,10 +96,9 @@ def extract_trajectory(output_dir: Union[Path, str], debug: Union[bool, None] =
 
 
 def write_list_of_dicts_to_file(output_file: Path, data: List[Dict]):
+    # json.dumps uses the C encoder, json.dump to a file handle falls back to the pure python one.
     with output_file.open('w') as fh:
-        for dict_to_store in data:
-            json.dump(dict_to_store, fh)
-            fh.write(os.linesep)
+        fh.writelines(json.dumps(dict_to_store) + os.linesep for dict_to_store in data)
 
 
 if __name__ == "__main__":
@@ -134,16 +134,20 @@ class CustomWorker(Worker):
         self.main_fidelity = get_main_fidelity(fidelity_space=benchmark.get_fidelity_space(),
                                                settings=settings)
 
+        # The type of the fidelity does not change during the run. Determine it only once.
+        self.fidelity_name = self.main_fidelity.name
+        self.is_int_fidelity = isinstance(self.main_fidelity, CS.hyperparameters.UniformIntegerHyperparameter) \
+            or isinstance(self.main_fidelity, CS.hyperparameters.NormalIntegerHyperparameter) \
+            or isinstance(self.main_fidelity.default_value, int)
+
     def compute(self, config: Dict, budget: Any, **kwargs) -> Dict:
         """Here happens the work in the optimization step. """
 
         run_id = SingleFidelityOptimizer._id_generator()
 
-        if isinstance(self.main_fidelity, CS.hyperparameters.UniformIntegerHyperparameter) \
-                or isinstance(self.main_fidelity, CS.hyperparameters.NormalIntegerHyperparameter) \
-                or isinstance(self.main_fidelity.default_value, int):
+        if self.is_int_fidelity:
             budget = int(budget)
-        fidelity = {self.main_fidelity.name: budget}
+        fidelity = {self.fidelity_name: budget}
 
         result_dict = self.benchmark.objective_function(configuration=config,
                                                         configuration_id=run_id,
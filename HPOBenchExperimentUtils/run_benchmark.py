@@ -21,7 +21,7 @@ from HPOBenchExperimentUtils.utils import PING_OPTIMIZER_IN_S, RESOURCE_FILENAME
 from HPOBenchExperimentUtils.utils.optimizer_utils import get_optimizer, optimizer_str_to_enum
 from HPOBenchExperimentUtils.utils.runner_utils import transform_unknown_params_to_dict, get_benchmark_settings, \
     load_benchmark, get_benchmark_names, get_optimizer_settings_names, \
-    get_optimizer_setting
+    get_optimizer_setting, set_env_variables_to_use_n_threads, set_thread_limits_of_loaded_libraries
 
 from HPOBenchExperimentUtils.resource_manager import FileBasedResourceManager
 
@@ -36,6 +36,7 @@ def run_benchmark(optimizer: str,
                   resource_file_dir: Union[Path, str, None] = None,
                   use_local: Union[bool, None] = False,
                   debug: bool = False,
+                  n_threads: int = 1,
                   **benchmark_params: Dict):
     """
     Run a HPOBench benchmark on a given Optimizer. Currently only SMAC, BOHB and Dragonfly are available as Optimizer.
@@ -66,6 +67,11 @@ def run_benchmark(optimizer: str,
     use_local : bool, None
         If you want to use the HPOBench benchamrks in a non-containerizd version (installed locally inside the
         current python environment), you can set this parameter to True. This is not recommend.
+    n_threads : int
+        Number of threads the numerical libraries (BLAS, OpenMP) of the benchmark may use. By default, the
+        experiments run on a single core. Values smaller than 1 use all available cores.
+        For containerized benchmarks, the limit is passed via environment variables. If `use_local` is set, the
+        benchmark runs in the already started python process. Then, the limit requires the package threadpoolctl.
     benchmark_params : Dict
         Some benchmarks take special parameters for the initialization. For example, The XGBOostBenchmark takes as
         input a task_id. This task_id specifies the OpenML dataset to use.
@@ -128,6 +134,11 @@ def run_benchmark(optimizer: str,
                                                 limits=limits)
     _log.debug(f'Output dir: {output_dir}. Resource file is in: {resource_file_dir}')
 
+    if n_threads != 1:
+        # Only affects processes which load the numerical libraries afterwards, e.g. the benchmark containers.
+        # A local benchmark is handled in the optimizer subprocess (see subprocess_run).
+        set_env_variables_to_use_n_threads(n_threads)
+
     # Load and instantiate the benchmark
     # noinspection PyTypeChecker
     benchmark_obj = load_benchmark(benchmark_name=settings['import_benchmark'],
@@ -147,7 +158,7 @@ def run_benchmark(optimizer: str,
                       args=(),
                       kwargs=dict(settings=settings, use_local=use_local, socket_id=benchmark.socket_id, rng=rng,
                                   optimizer_enum=optimizer_enum, output_dir=output_dir,
-                                  resource_file_dir=resource_file_dir))
+                                  resource_file_dir=resource_file_dir, n_threads=n_threads))
     process.start()
 
     time_waited = 0
@@ -197,11 +208,18 @@ def subprocess_run(settings: Dict,
                    rng: int,
                    optimizer_enum,
                    output_dir: Path,
-                   resource_file_dir: Path) -> None:
+                   resource_file_dir: Path,
+                   n_threads: int = 1) -> None:
 
     _log.info(f'Subprocess called with params: setting:{settings}\n'
               f'use_local:{use_local}\nsocket_id{socket_id}\nrng:{rng}\noutput_dir:{output_dir}')
 
+    # A local benchmark runs in this process. Its numerical libraries are already loaded and ignore the environment
+    # variables, so their limits have to be changed at runtime.
+    if use_local and n_threads != 1 and not set_thread_limits_of_loaded_libraries(n_threads):
+        _log.warning(f'n_threads={n_threads} has no effect on local benchmarks without threadpoolctl. '
+                     'The benchmark keeps running on a single core.')
+
     from hpobench import config_file
     container_source = config_file.container_source
 
@@ -266,6 +284,9 @@ if __name__ == "__main__":
     parser.add_argument('--rng', required=False, default=0, type=int)
     parser.add_argument('--use_local', action='store_true', default=False)
     parser.add_argument('--debug', action='store_true', default=False, help="When given, enables debug mode logging.")
+    parser.add_argument('--n_threads', required=False, default=1, type=int,
+                        help='Number of threads for the numerical libraries of the benchmark. Values smaller than 1 '
+                             'use all available cores. By default, a single core is used.')
     args, unknown = parser.parse_known_args()
     benchmark_params = transform_unknown_params_to_dict(unknown)
 
@@ -1,11 +1,16 @@
+from copy import deepcopy
+from functools import lru_cache
 from math import exp, log, floor
 from typing import List, Dict, Tuple, Union, Callable
 from pathlib import Path
 from argparse import Namespace
 import logging
-import os, uuid, sys
+import os, sys
+from tempfile import mkdtemp
 import json
 
+import numpy as np
+
 _log = logging.getLogger(__name__)
 
 # -------------------------------Begin code adapted directly from the dragonfly repo------------------------------------
@@ -51,6 +56,7 @@ _dragonfly_args = [
 ]
 
 
+@lru_cache(maxsize=None)
 def _get_command_line_args():
     """ Returns all arguments for the command line. """
     ret = _dragonfly_args + \
@@ -71,6 +77,12 @@ from dragonfly.parse.config_parser import load_parameters
 from dragonfly.exd.cp_domain_utils import load_config
 
 
+@lru_cache(maxsize=8)
+def _load_options(partial_options: frozenset) -> Namespace:
+    """ Parse the dragonfly options only once per set of partial options. Don't modify the returned namespace. """
+    return load_options(_get_command_line_args(), partial_options=dict(partial_options), cmd_line=False)
+
+
 def load_dragonfly_options(hpoexp_settings: Dict, config: Dict) -> Tuple[Namespace, Dict]:
     """ Interpret the options provided by HPOBenchExperimentUtils to those compatible with dragonfly. """
 
@@ -109,7 +121,7 @@ def load_dragonfly_options(hpoexp_settings: Dict, config: Dict) -> Tuple[Namespa
         partial_options["num_init_evals"] = init_eval * len(config["domain"])
 
     _log.debug("Passing these settings to the dragonfly optimizer:\n%s" % json.dumps(partial_options, indent=4))
-    options = load_options(_get_command_line_args(), partial_options=partial_options, cmd_line=False)
+    options = deepcopy(_load_options(frozenset(partial_options.items())))
     config = load_config(load_parameters(config))
     return options, config
 
@@ -136,8 +148,9 @@ def _handle_uniform_float(hyper: UniformFloatHyperparameter) -> Tuple[Dict, Call
     }
 
     parser = (lambda x: float(exp(x))) if hyper.log else (lambda x: float(x))
-    # Here, x is in the mapped space!
-    cost = lambda x: (x - domain['min']) / (domain['max'] - domain['min'])
+    # Here, x is in the mapped space! The cost function is called often, so bind the boundaries once.
+    lower, width = domain['min'], domain['max'] - domain['min']
+    cost = lambda x: (x - lower) / width
     return domain, parser, cost, domain['max']
 
 
@@ -177,7 +190,8 @@ def _handle_uniform_int(hyper: UniformFloatHyperparameter) -> Tuple[Dict, Callab
 
         # Here, x is in the dragonfly space!
         parser = lambda x: int(x)
-        cost = lambda x: (x - hyper.lower + 1) / (hyper.upper - hyper.lower + 1)
+        lower, width = hyper.lower, hyper.upper - hyper.lower + 1
+        cost = lambda x: (x - lower + 1) / width
         return domain, parser, cost, domain['max']
 
 
@@ -209,7 +223,8 @@ def _handle_categorical(hyper: CategoricalHyperparameter) -> Tuple[Dict, Callabl
     }
 
     parser = lambda x: choices[int(x)]
-    cost = lambda x: 1. / n
+    choice_cost = 1. / n
+    cost = lambda x: choice_cost
     return domain, parser, cost, str(n - 1)
 
 
@@ -256,7 +271,9 @@ def _configspace_to_dragonfly(params: List[Hyperparameter]) -> Tuple[Dict, List,
     costs = []
     maxima = []
     for param in params:
-        d, p, c, m = _handlers.get(type(param), _handler_unknown)(param)
+        # Walk the MRO to also find the handlers of subclasses. Usually, the first entry (the type itself) matches.
+        handler = next((_handlers[t] for t in type(param).__mro__ if t in _handlers), _handler_unknown)
+        d, p, c, m = handler(param)
         _log.debug("Mapped ConfigSpace Hyperparameter %s to dragonfly domain %s" % (str(param), str(d)))
         dragonfly_dict[param.name] = d
         parsers.append((param.name, p))
@@ -296,54 +313,47 @@ def generate_trajectory(history: Namespace, save_file: Path, is_cp=False, histor
         history_file = Path(history_file)
         if not history_file.is_absolute():
             history_file.expanduser().resolve()
-        recorded_history = []
         save_history = True
     else:
         save_history = False
 
-    trajectories = []
-    incumbent = {
-        "cpu_time": float(0),
-        "wallclock_time": float(0),
-        "evaluations": int(0),
-        "cost": float('inf'),
-        "incumbent": None,
-        "origin": "xxx"
-    }
-    update = False
-
-    for qinfo in history.query_qinfos:
-        # Remember, dragonfly maximizes.
-        # In the history namespace, query_true_vals refers to the values used for maximization, and query_vals refers
-        # to the actual value returned from the objective function. This means that if the optimizer was told to
-        # minimize instead of maximize, query_true_vals will be the negated query_vals. However, the corresponding
-        # fields in each query_qinfo do not follow this convention and always contain the value used for maximization.
-
-        if -qinfo.val < incumbent["cost"]:
-            incumbent = {
-                "cpu_time": qinfo.receive_time,
-                "wallclock_time": qinfo.receive_time,
-                "evaluations": qinfo.step_idx,
-                "cost": -qinfo.val,
-                "incumbent": [list(pt) for pt in qinfo.point] if is_cp else list(qinfo.point),
-                "origin": "xxx" if not hasattr(qinfo, "curr_acq") else qinfo.curr_acq
-            }
-            update = True
-
-        if not trajectories or update:
-            trajectories.append(incumbent)
-            update = False
-
-        if save_history:
-            recorded_history.append({
-                "cpu_time": qinfo.receive_time,
-                "wallclock_time": qinfo.receive_time,
-                "evaluations": qinfo.step_idx,
-                "cost": -qinfo.val,
-                "incumbent": [list(pt) for pt in qinfo.point] if is_cp else list(qinfo.point),
-                "origin": "xxx" if not hasattr(qinfo, "curr_acq") else qinfo.curr_acq
-            })
-    import json
+    def _qinfo_to_dict(qinfo):
+        return {
+            "cpu_time": qinfo.receive_time,
+            "wallclock_time": qinfo.receive_time,
+            "evaluations": qinfo.step_idx,
+            "cost": -qinfo.val,
+            "incumbent": [list(pt) for pt in qinfo.point] if is_cp else list(qinfo.point),
+            "origin": "xxx" if not hasattr(qinfo, "curr_acq") else qinfo.curr_acq
+        }
+
+    # Remember, dragonfly maximizes.
+    # In the history namespace, query_true_vals refers to the values used for maximization, and query_vals refers
+    # to the actual value returned from the objective function. This means that if the optimizer was told to
+    # minimize instead of maximize, query_true_vals will be the negated query_vals. However, the corresponding
+    # fields in each query_qinfo do not follow this convention and always contain the value used for maximization.
+    qinfos = history.query_qinfos
+    costs = -np.fromiter((qinfo.val for qinfo in qinfos), dtype=np.float64, count=len(qinfos))
+
+    # A query becomes the new incumbent if its cost is lower than the costs of all previous queries. Only these
+    # queries are converted to trajectory entries. fmin ignores NaNs like the comparison with the incumbent does.
+    incumbent_costs = np.fmin.accumulate(np.concatenate(([np.inf], costs)))[:-1]
+    trajectories = [_qinfo_to_dict(qinfos[i]) for i in np.flatnonzero(costs < incumbent_costs)]
+
+    if len(qinfos) != 0 and not costs[0] < np.inf:
+        # The first query did not improve on the initial incumbent, which is then the first trajectory entry.
+        trajectories.insert(0, {
+            "cpu_time": float(0),
+            "wallclock_time": float(0),
+            "evaluations": int(0),
+            "cost": float('inf'),
+            "incumbent": None,
+            "origin": "xxx"
+        })
+
+    if save_history:
+        recorded_history = [_qinfo_to_dict(qinfo) for qinfo in qinfos]
+
     with open(save_file, "w") as f:
         f.write("\n".join([json.dumps(t, indent=4) for t in trajectories]))
         # json.dump(trajectories, f, indent=4)
@@ -356,19 +366,20 @@ def generate_trajectory(history: Namespace, save_file: Path, is_cp=False, histor
 
 
 def change_cwd(tries=5):
-    if tries <= 0:
-        raise RuntimeError("Could not create random temporary dragonfly directory due to timeout.")
+    """ Switch to a new, unique temporary directory. Dragonfly writes its working files to the current directory. """
+    base_dir = Path(os.getenv('TMPDIR', "/tmp")) / "dragonfly"
 
-    tmp_dir = Path(os.getenv('TMPDIR', "/tmp")) / "dragonfly" / str(uuid.uuid4())
+    for _ in range(tries):
+        try:
+            base_dir.mkdir(parents=True, exist_ok=True)
+            # mkdtemp creates a directory with a unique name, so there is no need to handle collisions.
+            tmp_dir = mkdtemp(dir=base_dir)
+        except PermissionError as e:
+            _log.debug("Encountered PermissionError: %s" % e.strerror)
+            continue
 
-    try:
-        tmp_dir.mkdir(parents=True, exist_ok=False)
-    except FileExistsError:
-        change_cwd(tries=tries - 1)
-    except PermissionError as e:
-        _log.debug("Encountered PermissionError: %s" % e.strerror)
-        change_cwd(tries=tries - 1)
-    else:
         os.chdir(tmp_dir)
         _log.debug("Switched to temporary directory %s" % str(tmp_dir))
-    return
+        return
+
+    raise RuntimeError("Could not create random temporary dragonfly directory due to timeout.")
@@ -1,10 +1,9 @@
 import json
 import logging
+import math
 from enum import Enum
 from typing import Union, Optional, Any, Dict
 
-import numpy as np
-
 from HPOBenchExperimentUtils.utils.runner_utils import get_optimizer_settings_names
 
 _log = logging.getLogger(__name__)
@@ -218,23 +217,23 @@ def get_main_fidelity(fidelity_space, settings):
 def get_sh_ta_runs(min_budget: Union[int, float], max_budget: Union[int, float], eta: int, n0: Optional[int] = None) \
         -> int:
     """ Returns total number of configurations for a given SH configuration """
-    sh_iters = int(np.round((np.log(max_budget) - np.log(min_budget)) / np.log(eta), 8))
+    sh_iters = int(round((math.log(max_budget) - math.log(min_budget)) / math.log(eta), 8))
     if not n0:
         n0 = int(eta ** sh_iters)
-    n_configs = n0 * np.power(eta, -np.linspace(0, sh_iters, sh_iters + 1))
-    return int(sum(n_configs))
+    return int(sum(n0 * eta ** -float(i) for i in range(sh_iters + 1)))
 
 
 def get_number_ta_runs(iterations: int, min_budget: Union[int, float], max_budget: Union[int, float], eta: int) -> int:
     """ Returns the total number of configurations (ta runs) for a given HB configuration """
-    s_max = int(np.floor(np.log(max_budget / min_budget) / np.log(eta)))
+    # Round before flooring. Otherwise, e.g. log(243) / log(3) = 4.999... results in a bracket less.
+    s_max = int(math.floor(round(math.log(max_budget / min_budget) / math.log(eta), 8)))
 
     all_s = list(range(s_max+1))[::-1]
     hb_iters = [all_s[i % (s_max + 1)] for i in range(iterations)]
 
     ta_runs = 0
     for s in hb_iters:
-        n0 = int(np.floor((s_max + 1) / (s + 1)) * eta ** s)
+        n0 = int(((s_max + 1) // (s + 1)) * eta ** s)
         hb_min = eta ** -s * max_budget
         ta_runs += get_sh_ta_runs(hb_min, max_budget, eta, n0)
     return int(ta_runs)
@@ -1,4 +1,7 @@
 import logging
+import os
+from copy import deepcopy
+from functools import lru_cache
 from importlib import import_module
 from pathlib import Path
 from typing import List, Dict, Any
@@ -7,6 +10,13 @@ import yaml
 
 _log = logging.getLogger(__name__)
 
+try:
+    from threadpoolctl import threadpool_limits
+    _log.debug("Use threadpoolctl")
+except:
+    threadpool_limits = None
+    _log.debug("Installing threadpoolctl allows to change the thread limits of already loaded numerical libraries")
+
 
 def transform_unknown_params_to_dict(unknown_args: List) -> Dict:
     """
@@ -38,8 +48,63 @@ def transform_unknown_params_to_dict(unknown_args: List) -> Dict:
     return benchmark_params
 
 
+def set_env_variables_to_use_n_threads(n_threads: int) -> None:
+    """
+    Set the thread limits of the numerical libraries (BLAS, OpenMP, numexpr) to `n_threads`.
+
+    When importing the HPOBenchExperimentUtils, those limits are set to a single core. The libraries read the
+    environment variables only when they are loaded. So, the new limits only apply to processes which load them
+    afterwards, e.g. the benchmark containers. Libraries which are already loaded in this process (and in processes
+    forked from it) keep their limits. See `set_thread_limits_of_loaded_libraries`.
+
+    Parameters
+    ----------
+    n_threads : int
+        Number of threads. If it is smaller than 1, use all available cores.
+    """
+    if n_threads < 1:
+        n_threads = os.cpu_count() or 1
+
+    for variable in ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+                     'NUMEXPR_NUM_THREADS', 'NUMEXPR_MAX_THREADS']:
+        os.environ[variable] = str(n_threads)
+    _log.debug(f'Limit the numerical libraries to {n_threads} thread(s)')
+
+
+def set_thread_limits_of_loaded_libraries(n_threads: int) -> bool:
+    """
+    Change the thread limits of the numerical libraries (BLAS, OpenMP), which are already loaded in this process.
+    This requires the optional package threadpoolctl.
+
+    Parameters
+    ----------
+    n_threads : int
+        Number of threads. If it is smaller than 1, use all available cores.
+
+    Returns
+    -------
+    bool
+        False if threadpoolctl is not installed and the limits could not be changed.
+    """
+    if threadpool_limits is None:
+        return False
+
+    if n_threads < 1:
+        n_threads = os.cpu_count() or 1
+
+    threadpool_limits(limits=n_threads)
+    _log.debug(f'Limit the loaded numerical libraries to {n_threads} thread(s)')
+    return True
+
+
 def load_optimizer_settings() -> Dict:
     """ Load the experiment settings from file """
+    return deepcopy(_load_optimizer_settings())
+
+
+@lru_cache(maxsize=None)
+def _load_optimizer_settings() -> Dict:
+    # The file is only read once. Don't modify the returned dict, but a copy of it.
     optimizer_settings_path = Path(__file__).absolute().parent.parent / 'optimizer_settings.yaml'
     with optimizer_settings_path.open('r') as fh:
         optimizer_settings = yaml.load(fh, yaml.FullLoader)
@@ -47,22 +112,27 @@ def load_optimizer_settings() -> Dict:
 
 
 def get_optimizer_settings_names():
-    settings = load_optimizer_settings()
+    settings = _load_optimizer_settings()
     return list(settings.keys())
 
 
 def get_optimizer_setting(optimizer_setting_str: str) -> Dict:
-    optimizer_settings = load_optimizer_settings()
-    settings_names = get_optimizer_settings_names()
+    optimizer_settings = _load_optimizer_settings()
 
-    assert optimizer_setting_str in settings_names,\
-        f"Optimizer setting {optimizer_setting_str} not found. Should be one of {', '.join(settings_names)}"
+    assert optimizer_setting_str in optimizer_settings,\
+        f"Optimizer setting {optimizer_setting_str} not found. Should be one of {', '.join(optimizer_settings)}"
 
-    return optimizer_settings[optimizer_setting_str]
+    return deepcopy(optimizer_settings[optimizer_setting_str])
 
 
 def load_benchmark_settings() -> Dict:
     """ Load the experiment settings from file """
+    return deepcopy(_load_benchmark_settings())
+
+
+@lru_cache(maxsize=None)
+def _load_benchmark_settings() -> Dict:
+    # The file is only read once. Don't modify the returned dict, but a copy of it.
     experiment_settings_path = Path(__file__).absolute().parent.parent / 'benchmark_settings.yaml'
 
     with experiment_settings_path.open('r') as fh:
@@ -73,7 +143,7 @@ def load_benchmark_settings() -> Dict:
 
 def get_benchmark_names():
     """ Get the names for the supported benchmarks. """
-    experiment_settings = load_benchmark_settings()
+    experiment_settings = _load_benchmark_settings()
     return list(experiment_settings.keys())
 
 
@@ -93,13 +163,13 @@ def get_benchmark_settings(benchmark: str) -> Dict:
     -------
         Tuple[Dict, Dict] - optimizer settings, benchmark settings
     """
-    experiment_settings = load_benchmark_settings()
+    experiment_settings = _load_benchmark_settings()
     benchmark_names = get_benchmark_names()
 
     assert benchmark in benchmark_names,\
         f"benchmark name {benchmark} not found. Should be one of {', '.join(benchmark_names)}"
 
-    experiment_settings = experiment_settings[benchmark]
+    experiment_settings = deepcopy(experiment_settings[benchmark])
 
     # Check that all mandatory fields are in the settings given:
     mandatory = ['time_limit_in_s', 'cutoff_in_s', 'mem_limit_in_mb', 'import_from', 'import_benchmark']
@@ -119,6 +189,7 @@ def get_benchmark_settings(benchmark: str) -> Dict:
     return experiment_settings
 
 
+@lru_cache(maxsize=32)
 def load_benchmark(benchmark_name, import_from, use_local: bool) -> Any:
     """
     Load the benchmark object.
@@ -141,6 +212,7 @@ def load_benchmark(benchmark_name, import_from, use_local: bool) -> Any:
     Returns
     -------
     Benchmark
+        The benchmark class. The import is cached, repeated calls return the same class object.
     """
     import_str = 'hpobench.' + ('container.' if not use_local else '') + 'benchmarks.' + import_from
     _log.debug(f'Try to execute command: from {import_str} import {benchmark_name}')
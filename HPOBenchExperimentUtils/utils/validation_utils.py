@@ -1,8 +1,9 @@
 import logging
 import os
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Tuple, Union
 import time
 
 import numpy as np
@@ -20,8 +21,17 @@ try:
     _log.debug("Use ujson")
 except:
     import json
+    import json as json_backup
     _log.debug("Using json. Installing ujson could provide speedup")
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _log.debug("Use orjson for reading json files")
+except:
+    _json_loads = json.loads
+    _log.debug("Installing orjson could provide speedup for reading json files")
+
 
 def write_validated_trajectory(unvalidated_traj: List, validation_results: Dict, unvalidated_traj_path: Path):
     """
@@ -79,9 +89,7 @@ def write_validated_trajectory(unvalidated_traj: List, validation_results: Dict,
 
     validated_trajectory_path = unvalidated_traj_path.parent / name
     with validated_trajectory_path.open('w') as fh:
-        for dict_to_store in validated_trajectory:
-            json.dump(dict_to_store, fh)
-            fh.write(os.linesep)
+        fh.writelines(json.dumps(dict_to_store) + os.linesep for dict_to_store in validated_trajectory)
 
     _log.info(f'Writing the trajectory to {validated_trajectory_path} was successful.')
 
@@ -128,7 +136,7 @@ def load_json_files(file_paths: List[Path]) -> List:
         file_content = []
         for line in lines:
             try:
-                r = json.loads(line)
+                r = _json_loads(line)
             except:
                 try:
                     r = json_backup.loads(line)
@@ -143,6 +151,90 @@ def load_json_files(file_paths: List[Path]) -> List:
     return data
 
 
+def load_json_files_cached(file_paths: List[Path]) -> List:
+    """
+    Same as `load_json_files`, but keep the content in a least recently used cache of at most
+    `_JSON_FILES_CACHE_MAXSIZE` file lists. Calling this function again with the same files (e.g. from different
+    plotting functions) doesn't parse the files again, unless they were evicted in the meantime or the cache was
+    emptied with `clear_json_files_cache`.
+
+    Note: The returned lists (and the entries in them) are shared between the calls. Treat them as read-only and
+    don't modify them in place.
+
+    Parameters
+    ----------
+    file_paths: List[Path]
+
+    Returns
+    -------
+    List
+        List of lists. Each list contains the content of a json file.
+    """
+    key = _json_files_cache_key(file_paths)
+    try:
+        data = _json_files_cache[key]
+        _json_files_cache.move_to_end(key)
+    except KeyError:
+        data = load_json_files(file_paths)
+        _add_to_json_files_cache(key, data)
+    return data
+
+
+def preload_json_files(file_path_lists: List[List[Path]], n_jobs: Union[int, None] = None):
+    """
+    Read in multiple lists of json files (e.g. the runhistories of multiple optimizers) in parallel processes and
+    store them in the cache of `load_json_files_cached`. Lists which are already cached are skipped.
+
+    Parameters
+    ----------
+    file_path_lists: List[List[Path]]
+    n_jobs: int, None
+        Number of processes. Defaults to the number of cpus.
+    """
+    # Lists beyond the cache size would evict each other before they are used.
+    missing = {}
+    for file_paths in file_path_lists[:_JSON_FILES_CACHE_MAXSIZE]:
+        key = _json_files_cache_key(file_paths)
+        if key in _json_files_cache:
+            _json_files_cache.move_to_end(key)
+        else:
+            missing[key] = file_paths
+
+    n_jobs = min(len(missing), n_jobs or os.cpu_count() or 1)
+    if n_jobs <= 1:
+        for key, file_paths in missing.items():
+            _add_to_json_files_cache(key, load_json_files(file_paths))
+        return
+
+    _log.debug("Reading %d lists of files with %d processes" % (len(missing), n_jobs))
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        for key, data in zip(missing, executor.map(load_json_files, missing.values())):
+            _add_to_json_files_cache(key, data)
+
+
+def clear_json_files_cache():
+    """ Remove all entries from the cache of `load_json_files_cached` to free their memory. """
+    _json_files_cache.clear()
+
+
+def _json_files_cache_key(file_paths: List[Path]) -> Tuple[str, ...]:
+    return tuple(str(Path(file).resolve()) for file in file_paths)
+
+
+def _add_to_json_files_cache(key: Tuple[str, ...], data: List):
+    """ Store the data as most recently used entry and drop the least recently used ones if the cache is full. """
+    _json_files_cache[key] = data
+    _json_files_cache.move_to_end(key)
+    while len(_json_files_cache) > _JSON_FILES_CACHE_MAXSIZE:
+        _json_files_cache.popitem(last=False)
+
+
+# Least recently used cache of the parsed json files. The keys are the resolved paths of the file lists.
+# One entry holds the files of one optimizer, so the cache can hold all optimizers of a benchmark.
+_JSON_FILES_CACHE_MAXSIZE = 32
+_json_files_cache: 'OrderedDict[Tuple[str, ...], List]' = OrderedDict()
+
+
 def load_configs_with_function_values_from_runhistories(file_paths: List[Path]):
 
     if len(file_paths) == 0:
@@ -259,39 +351,42 @@ def df_per_optimizer(key, unvalidated_trajectories, y_best: float=0):
     if y_best != 0:
         _log.info("Found y_best = %g; Going to compute regret" % y_best)
     _log.info("Creating DataFrame for %d inputs" % len(unvalidated_trajectories))
-    dataframe = {
-        "optimizer": [],
-        "id": [],
-        "total_time_used": [],
-        "total_objective_costs": [],
-        "function_values": [],
-        "fidel_values": [],
-        "costs": [],
-        "start_time": [],
-        "finish_time": [],
+
+    # Fields of the records and their column names in the data frame
+    fields = {
+        'total_time_used': 'total_time_used',
+        'total_objective_costs': 'total_objective_costs',
+        'function_value': 'function_values',
+        'cost': 'costs',
+        'start_time': 'start_time',
+        'finish_time': 'finish_time',
     }
+    field_names = list(fields)
+    columns = ["optimizer", "id", "total_time_used", "total_objective_costs", "function_values", "fidel_values",
+               "costs", "start_time", "finish_time"]
 
+    # Collect the records of all trajectories (without the boot time entry) in a single list
+    records = []
+    n_records = np.zeros(len(unvalidated_trajectories), dtype=np.int64)
     for id, traj in enumerate(unvalidated_trajectories):
         _log.debug("Handling input with %d records for %s" % (len(traj), key))
-        function_values = [record['function_value']-y_best for record in traj[1:]]
-        total_time_used = [record['total_time_used'] for record in traj[1:]]
-        total_obj_costs = [record['total_objective_costs'] for record in traj[1:]]
-        costs = [record['cost'] for record in traj[1:]]
-        start = [record['start_time'] for record in traj[1:]]
-        finish = [record['finish_time'] for record in traj[1:]]
-
-        # this is a dict with only one entry
-        fidel_values = [record['fidelity'][list(record['fidelity'])[0]] for record in traj[1:]]
-
-        dataframe["optimizer"].extend([key for _ in range(len(traj[1:]))])
-        dataframe["id"].extend([id for _ in range(len(traj[1:]))])
-        dataframe['total_time_used'].extend(total_time_used)
-        dataframe['total_objective_costs'].extend(total_obj_costs)
-        dataframe['function_values'].extend(function_values)
-        dataframe['fidel_values'].extend(fidel_values)
-        dataframe['costs'].extend(costs)
-        dataframe['start_time'].extend(start)
-        dataframe['finish_time'].extend(finish)
-
-    dataframe = pd.DataFrame(dataframe)
+        records.extend(traj[1:])
+        n_records[id] = len(traj) - 1
+
+    # Let pandas collect the fields from the records
+    data = pd.DataFrame(records, columns=field_names).rename(columns=fields)
+    data = data.astype({column: np.float64 for column in fields.values()})
+    if y_best != 0:
+        data['function_values'] -= y_best
+
+    # this is a dict with only one entry
+    data['fidel_values'] = [next(iter(record['fidelity'].values())) for record in records]
+
+    # The optimizer and the seed ids are only used for grouping and filtering. Build them directly as categoricals
+    # from their codes. Only ids of trajectories with records are categories.
+    ids = np.flatnonzero(n_records > 0)
+    data['id'] = pd.Categorical.from_codes(np.repeat(np.arange(len(ids)), n_records[ids]), categories=ids)
+    data['optimizer'] = pd.Categorical.from_codes(np.zeros(len(records), dtype=np.int8), categories=[key])
+
+    dataframe = data[columns]
     return dataframe
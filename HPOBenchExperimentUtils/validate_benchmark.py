@@ -1,8 +1,10 @@
 import argparse
 import logging
+import os
 import threading
+from contextlib import ExitStack
 from pathlib import Path
-from typing import Union, Dict
+from typing import Union, Dict, List
 
 from HPOBenchExperimentUtils import _log as _root_log
 from HPOBenchExperimentUtils.core.nameserver import start_nameserver
@@ -31,6 +33,7 @@ def validate_benchmark(benchmark: str,
                        interface: str = 'lo',
                        nameserver_port: int = 0,
                        recompute_all: bool = False,
+                       n_workers: int = 1,
                        **benchmark_params: Dict,
                        ):
     """
@@ -99,6 +102,11 @@ def validate_benchmark(benchmark: str,
     recompute_all : bool, None
         If you want to recompute all validation results regardless of whether already precomputed results exist or not.
 
+    n_workers : int
+        Number of workers, which the scheduler starts in the background. Each worker has its own benchmark and
+        evaluates configurations in parallel to the other ones. The workers get the ids worker_id, ...,
+        worker_id + n_workers - 1. By default 1.
+
     benchmark_params : Dict
         Some benchmarks take special parameters for the initialization. For example, The XGBOostBenchmark takes as
         input a task_id. This task_id specifies the OpenML dataset to use.
@@ -147,9 +155,11 @@ def validate_benchmark(benchmark: str,
 
     # STEP 1: Load the configuration which should be validated.
     # Find the paths to the trajectory files
-    trajectories_paths = list(output_dir.rglob(TRAJECTORY_V1_FILENAME))
-    trajectories_paths += list(output_dir.rglob(TRAJECTORY_V2_FILENAME))
-    trajectories_paths += list(output_dir.rglob(TRAJECTORY_V3_FILENAME))
+    found_files = _find_files(output_dir, [TRAJECTORY_V1_FILENAME, TRAJECTORY_V2_FILENAME, TRAJECTORY_V3_FILENAME,
+                                           VALIDATED_RUNHISTORY_FILENAME])
+    trajectories_paths = found_files[TRAJECTORY_V1_FILENAME]
+    trajectories_paths += found_files[TRAJECTORY_V2_FILENAME]
+    trajectories_paths += found_files[TRAJECTORY_V3_FILENAME]
 
     # Load both trajectories: The larger-is-better-trajectory (v1) and the only-better-counts-trajectory
     trajectories = load_json_files(trajectories_paths)
@@ -158,7 +168,7 @@ def validate_benchmark(benchmark: str,
     configurations = extract_configs_from_trajectories(trajectories)
 
     # Load the results (already validated configurations) from previous runs
-    validated_runhistory_paths = list(output_dir.rglob(VALIDATED_RUNHISTORY_FILENAME))
+    validated_runhistory_paths = found_files[VALIDATED_RUNHISTORY_FILENAME]
     already_evaluated_configs = load_configs_with_function_values_from_runhistories(validated_runhistory_paths)
 
     # This dict stores all results from the validation procedure (key is the configuration but as str)
@@ -206,16 +216,24 @@ def validate_benchmark(benchmark: str,
                                       credentials_file=credentials_file,
                                       thread_name=f'HPOBenchExpUtils Run {run_id}')
 
-    with Worker(run_id=run_id, worker_id=worker_id, ns_ip=ns_ip, ns_port=ns_port, object_ip=current_ip,
-                debug=debug) as worker:
-
-        worker.start_up(benchmark_settings, benchmark_params, rng, use_local)
-        main_logger.debug(f'Benchmark initialized. Additional benchmark parameters {benchmark_params}')
-        worker_thread = threading.Thread(target=worker.run, name=f'Worker Thread {worker_id}', daemon=True)
-        worker_thread.start()
+    assert n_workers >= 1, f'The scheduler needs at least one worker, but n_workers is {n_workers}'
+    with ExitStack() as stack:
+        workers = []
+        for i in range(n_workers):
+            worker = stack.enter_context(Worker(run_id=run_id, worker_id=worker_id + i, ns_ip=ns_ip, ns_port=ns_port,
+                                                object_ip=current_ip, debug=debug))
+            # The worker adds the container source to the benchmark parameters. It is the same for all workers. The
+            # contents below pass it on to the benchmark calls.
+            worker.start_up(benchmark_settings, benchmark_params, rng, use_local)
+            workers.append(worker)
+        main_logger.debug(f'{n_workers} benchmark(s) initialized. Additional benchmark parameters {benchmark_params}')
+
+        for i, worker in enumerate(workers):
+            worker_thread = threading.Thread(target=worker.run, name=f'Worker Thread {worker_id + i}', daemon=True)
+            worker_thread.start()
 
         # give the scheduler the list of configs to validate
-        fidelity_space = worker.benchmark.get_fidelity_space()
+        fidelity_space = workers[0].benchmark.get_fidelity_space()
         default_fidelity = fidelity_space.get_default_configuration()
         default_fidelity = default_fidelity.get_dictionary()
 
@@ -243,6 +261,19 @@ def validate_benchmark(benchmark: str,
     return 1
 
 
+def _find_files(output_dir: Path, file_names: List[str]) -> Dict[str, List[Path]]:
+    """
+    Collect the paths to all files in the output directory (and its subdirectories) with one of the given names.
+    In contrast to calling rglob once per file name, the directory tree is walked only once.
+    """
+    found_files = {name: [] for name in file_names}
+    for root, _, files in os.walk(output_dir):
+        for name in files:
+            if name in found_files:
+                found_files[name].append(Path(root) / name)
+    return found_files
+
+
 def parse_args():
     main_parser = argparse.ArgumentParser(description='HPOBench validated a trajectory from a benchmark with a '
                                                       'unified interface')
@@ -271,6 +302,8 @@ def parse_args():
                                              parents=[common_args_parser])
     scheduler_parser.add_argument('--nameserver_port', type=int, default=0, required=False)
     scheduler_parser.add_argument('--recompute_all', action='store_true', default=False)
+    scheduler_parser.add_argument('--n_workers', type=int, default=1, required=False,
+                                  help='Number of workers to start next to the scheduler.')
 
     worker_parser = subparsers.add_parser('start_worker', help='Start only a worker.',
                                           parents=[common_args_parser])
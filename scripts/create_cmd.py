@@ -1,6 +1,7 @@
 import argparse
+import itertools
 import os
-from hpobench.util.openml_data_manager import get_openmlcc18_taskids
+from functools import lru_cache
 
 expset_dc = {
     "NAS201": ["Cifar10ValidNasBench201Benchmark", "Cifar100NasBench201Benchmark",
@@ -43,6 +44,17 @@ opt_set = {
     "ray": ["ray_hyperopt", "ray_randomsearch", "ray_hyperopt_asha"],
 }
 
+# These benchmarks are run on each of the OpenML-CC18 tasks
+_CC18_BENCHMARKS = frozenset({"svm", "xgboostsub", "xgboostest"})
+
+
+@lru_cache(maxsize=None)
+def _cc18_task_ids():
+    """ Look up the OpenML-CC18 task ids only once instead of once per optimizer and seed. """
+    # Importing hpobench is slow. Only do it, if an experiment needs the task ids.
+    from hpobench.util.openml_data_manager import get_openmlcc18_taskids
+    return tuple(get_openmlcc18_taskids())
+
 
 def main(args):
     exp = args.exp
@@ -65,19 +77,20 @@ def main(args):
 
     base = f"python {args.root}/HPOBenchExperimentUtils"
 
+    seeds = range(1, nrep + 1)
+
     for benchmark in expset_dc[exp]:
-        for optimizer in opt_set[opt]:
-            for seed in range(1, nrep + 1):
-                if benchmark in ["svm", "xgboostsub", "xgboostest"]:
-                    for tid in get_openmlcc18_taskids():
-                        cmd = "%s/run_benchmark.py --output_dir %s --optimizer %s --benchmark %s" \
-                              " --rng %s --task_id %d" % \
-                              (base, args.out_run, optimizer, benchmark, seed, tid)
-                        run_cmd.append(cmd)
-                else:
-                    cmd = "%s/run_benchmark.py --output_dir %s --optimizer %s --benchmark %s " \
-                          "--rng %s" % (base, args.out_run, optimizer, benchmark, seed)
-                    run_cmd.append(cmd)
+        # Only the seed and the task id change per command.
+        prefixes = [f"{base}/run_benchmark.py --output_dir {args.out_run} --optimizer {optimizer} "
+                    f"--benchmark {benchmark} --rng " for optimizer in opt_set[opt]]
+
+        # Whether the benchmark runs on the CC18 tasks depends only on the benchmark.
+        needs_tid = benchmark in _CC18_BENCHMARKS
+        if needs_tid:
+            run_cmd.extend(f"{prefix}{seed} --task_id {tid:d}"
+                           for prefix, seed, tid in itertools.product(prefixes, seeds, _cc18_task_ids()))
+        else:
+            run_cmd.extend(f"{prefix}{seed}" for prefix, seed in itertools.product(prefixes, seeds))
 
         if opt == "rs":
             # We only need this once since it works for all optimizers
@@ -110,16 +123,18 @@ def main(args):
             write_cmd(c, f)
 
 
-def write_cmd(cmd_list, out_fl):
-    if len(cmd_list) > 10000:
-        ct = 0
-        while len(cmd_list) > 10000:
-            write_cmd(cmd_list[:10000], out_fl + "_%d" % ct)
-            ct += 1
-            cmd_list = cmd_list[10000:]
-    else:
+def write_cmd(cmd_list, out_fl, chunk_size=10000):
+    """ Write the commands to out_fl. More than chunk_size commands are split into out_fl_0, out_fl_1, ... """
+    if len(cmd_list) <= chunk_size:
         with open(out_fl, "w") as fh:
             fh.write("\n".join(cmd_list))
+        return
+
+    # Consume the commands chunk by chunk from a single iterator instead of slicing copies of the remaining list.
+    cmd_iter = iter(cmd_list)
+    for ct in range((len(cmd_list) + chunk_size - 1) // chunk_size):
+        with open(out_fl + "_%d" % ct, "w") as fh:
+            fh.write("\n".join(itertools.islice(cmd_iter, chunk_size)))
 
 
 if __name__ == "__main__":